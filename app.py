@@ -1,8 +1,10 @@
+import re
+from collections import namedtuple
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
-import gspread
-from urllib.parse import urlparse, parse_qs
+import altair as alt
+from urllib.parse import urlparse, parse_qs, unquote_plus
 
 # --- Configuration for Google Sheets ---
 # Name of your Google Sheet
@@ -10,6 +12,51 @@ SHEET_NAME = "CfA_mentions_tracker"
 # Name of the worksheet you want to read from
 WORKSHEET_NAME = "Sheet1" 
 
+# Sheet columns used by the dashboard
+COLUMNS = ['daily_update', 'source', 'title', 'snippet', 'url']
+
+# Prepared mentions (latest first) plus aggregates that don't depend on the slider
+DashboardData = namedtuple('DashboardData', ['mentions', 'mentions_over_time'])
+
+# Text columns are kept as Arrow-backed strings (contiguous buffers, vectorized str kernels)
+TEXT_DTYPE = 'string[pyarrow]'
+
+# Number of mentions shown per page of the details table
+TABLE_PAGE_SIZE = 500
+
+# Matches the target of a Google redirect link (the 'url' query parameter)
+REDIRECT_URL_PATTERN = r'[?&]url=([^&#]+)'
+
+# Matches the host part of a URL, without any leading 'www.'
+HOST_PATTERN = r'://(?:www\.)?([^/?#]+)'
+
+# Format of the 'daily_update' column in the sheet, e.g. "August 23, 2025"
+DATE_FORMAT = '%B %d, %Y'
+
+# Domains for each source category
+# Add more categories as needed
+DOMAIN_CATEGORIES = {
+    'yahoo.com': 'News Outlet',
+    'reuters.com': 'News Outlet',
+    'afp.com': 'News Outlet',
+    'france24.com': 'News Outlet',
+    'laviesenegalaise.com': 'News Outlet',
+    'iol.co.za': 'News Outlet',
+    'tuko.co.ke': 'News Outlet',
+    'bizcommunity.com': 'News Outlet',
+    'pressreader.com': 'Digital Paper/Magazine',
+    'twitter.com': 'Social Media',
+    'facebook.com': 'Social Media',
+    'blogspot.com': 'Blog',
+    'wordpress.com': 'Blog',
+}
+# Every category in priority order: a URL mentioning several domains gets the earliest one
+SOURCE_CATEGORIES = list(dict.fromkeys(DOMAIN_CATEGORIES.values())) + ['Other']
+# The same categories (priority is also display order) as a fixed dtype, so counts are a bincount over codes
+SOURCE_CATEGORY_DTYPE = pd.CategoricalDtype(SOURCE_CATEGORIES)
+# A single alternation over every domain, so each URL is scanned once however long the list grows
+DOMAIN_RE = re.compile('(' + '|'.join(map(re.escape, DOMAIN_CATEGORIES)) + ')')
+
 def get_clean_url(google_url):
     """Extracts the clean URL from a Google redirect link."""
     try:
@@ -19,122 +66,190 @@ def get_clean_url(google_url):
     except (KeyError, IndexError):
         return google_url
 
+def clean_urls(urls):
+    """Vectorized get_clean_url: extracts clean URLs from a Series of Google redirect links."""
+    urls = urls.astype(TEXT_DTYPE)
+    extracted = urls.str.extract(REDIRECT_URL_PATTERN, expand=False)
+    matched = extracted.notna()
+    cleaned = urls.copy()
+    # Only the extracted targets need decoding, like parse_qs does
+    cleaned[matched] = extracted[matched].map(unquote_plus)
+    return cleaned
+
 def categorize_source(url):
     """Categorizes a source based on its URL."""
-    url_lower = url.lower()
-    if ('yahoo.com' in url_lower or 'reuters.com' in url_lower or 
-        'afp.com' in url_lower or 'france24.com' in url_lower or
-        'laviesenegalaise.com' in url_lower or 'iol.co.za' in url_lower or
-        'tuko.co.ke' in url_lower or 'bizcommunity.com' in url_lower):
-        return 'News Outlet'
-    elif 'pressreader.com' in url_lower:
-        return 'Digital Paper/Magazine'
-    elif 'twitter.com' in url_lower or 'facebook.com' in url_lower:
-        return 'Social Media'
-    elif 'blogspot.com' in url_lower or 'wordpress.com' in url_lower:
-        return 'Blog'
-    # Add more categories as needed
-    else:
+    matches = DOMAIN_RE.findall(url.lower())
+    if not matches:
         return 'Other'
+    return min((DOMAIN_CATEGORIES[match] for match in matches), key=SOURCE_CATEGORIES.index)
+
+def categorize_sources(urls):
+    """
+    Vectorized categorize_source: categorizes each distinct host once and maps the result back to every row.
+    Every URL is categorized by its host alone (without 'www.'), whether or not it came from a Google redirect.
+    A domain that only appears in the path or query, e.g. the target of a redirect clean_urls could not unwrap,
+    is not counted. Values without a scheme are categorized on the whole string.
+    """
+    url_lower = urls.astype(TEXT_DTYPE).str.lower()
+    hosts = url_lower.str.extract(HOST_PATTERN, expand=False).fillna(url_lower).fillna('')
+    codes, unique_hosts = pd.factorize(hosts)
+    categories = SOURCE_CATEGORY_DTYPE.categories
+    lookup = np.array([categories.get_loc(categorize_source(host)) for host in unique_hosts], dtype=int)
+    return pd.Categorical.from_codes(lookup[codes], dtype=SOURCE_CATEGORY_DTYPE)
+
+def parse_dates(dates):
+    """Parses dates with the known DATE_FORMAT, inferring the format only for rows that don't match."""
+    parsed = pd.to_datetime(dates, format=DATE_FORMAT, errors='coerce', cache=True)
+    unmatched = parsed.isna() & dates.notna()
+    if unmatched.any():
+        # Timezone-aware or finer-resolution values are brought to naive UTC at the same resolution first
+        fallback = pd.to_datetime(dates[unmatched], format='mixed', errors='coerce', utc=True, cache=True)
+        parsed = parsed.fillna(fallback.dt.tz_localize(None).astype(parsed.dtype))
+    return parsed
+
+class SheetColumnsError(Exception):
+    """Raised when the Google Sheet's header row lacks columns the dashboard needs."""
+    def __init__(self, missing_columns):
+        super().__init__(f"The Google Sheet is missing columns: {', '.join(missing_columns)}. Please check the header row.")
 
 # Function to load data directly from Google Sheets
 @st.cache_data(ttl=600)  # Cache data for 10 minutes to avoid hitting API limits
 def load_data_from_google_sheet():
-    """Reads data from a Google Sheet using a service account credentials from st.secrets."""
+    """Reads data from a Google Sheet using a service account credentials from st.secrets, returning DashboardData."""
+    import gspread  # Imported here so app start-up and cached reruns don't pay for it
+
     try:
         creds_json = st.secrets["gcp_service_account"]
         client = gspread.service_account_from_dict(creds_json)
         sheet = client.open(SHEET_NAME).worksheet(WORKSHEET_NAME)
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-        return df
+        # Plain rows (no per-row dicts)
+        values = sheet.get_all_values()
     except Exception as e:
         st.error(f"Error connecting to Google Sheet: {e}. Please check your credentials and sheet name.")
         return None
 
-def display_dashboard(df_combined):
-    """
-    Displays the dashboard with a more visually appealing design, now focusing on the latest mentions.
-    """
-    # Clean the column names for easier access
-    df_combined.columns = [col.strip().lower() for col in df_combined.columns]
+    header, *rows = values or [[]]
+    # The header row is cleaned once here
+    header = pd.Index(header).str.strip().str.lower()
+    missing_columns = [col for col in COLUMNS if col not in header]
+    if missing_columns:
+        # Raised rather than returned so the failure isn't cached; a fixed header is picked up on the next rerun
+        raise SheetColumnsError(missing_columns)
+    # Only build the columns the dashboard uses (the first one, if a header is duplicated)
+    positions = {col: int(np.flatnonzero(header == col)[0]) for col in COLUMNS}
+    df = pd.DataFrame({col: [row[i] for row in rows] for col, i in positions.items()}, dtype=TEXT_DTYPE)
+    # Prepare behind the same cache, so each 10-minute window cleans the data only once
+    return prepare_data(df)
+
+def prepare_data(df_raw):
+    """Cleans sources, URLs, dates and source categories once per loaded dataset, returning DashboardData."""
+    df = df_raw.copy()
+
+    # Sources repeat a lot, so store them as categories (integer codes)
+    df['source'] = df['source'].astype(TEXT_DTYPE).str.strip().astype('category')
+
+    # Filter out mentions from 'pesa check', normalizing only the distinct source names
+    source_names = df['source'].cat.categories
+    excluded_sources = source_names[source_names.str.casefold() == 'pesacheck']
+    df = df[~df['source'].isin(excluded_sources)].copy()
+    df['source'] = df['source'].cat.remove_unused_categories()
 
     # Extract clean URLs from the Google redirect links
-    df_combined['url'] = df_combined['url'].apply(get_clean_url)
+    df['url'] = clean_urls(df['url'])
 
     # Convert 'daily_update' to datetime format
     # Use 'coerce' to handle potential non-date values by setting them to NaT, then drop them
-    df_combined['daily_update'] = pd.to_datetime(df_combined['daily_update'], errors='coerce')
-    df_combined.dropna(subset=['daily_update'], inplace=True) # Ensure valid dates
+    df['daily_update'] = parse_dates(df['daily_update'])
+    df.dropna(subset=['daily_update'], inplace=True) # Ensure valid dates
 
     # Add the new source category column
-    df_combined['source_category'] = df_combined['url'].apply(categorize_source)
+    df['source_category'] = categorize_sources(df['url'])
 
-    # --- APPLYING REQUESTED FILTERS AND SORTS ---
-    
-    # 1. Filter out mentions from 'pesa check'
-    # Normalize source
-    sources_lower = df_combined['source'].astype(str).str.strip().str.lower()
-    df_filtered_all = df_combined[~sources_lower.isin(['pesacheck', 'PesaCheck'])].copy()
+    # Sort by 'daily_update' in descending order (latest first) so the dashboard can slice instead of re-sorting
+    df = df.sort_values(by='daily_update', ascending=False, kind='stable').reset_index(drop=True)
 
-    # Sort the DataFrame by 'daily_update' in descending order to easily select the latest
-    df_filtered_all.sort_values(by='daily_update', ascending=False, inplace=True)
-    
-    # --- Sidebar Widget for Latest Mentions ---
+    # The frame is sorted, so each day is one contiguous run: count run lengths instead of hashing or re-sorting
+    days = df['daily_update'].to_numpy().astype('datetime64[D]')[::-1]  # Oldest first
+    run_starts = np.ones(len(days), dtype=bool)
+    run_starts[1:] = days[1:] != days[:-1]
+    starts = np.flatnonzero(run_starts)
+    counts = np.diff(np.append(starts, len(days)))
+    mentions_over_time = pd.Series(counts, index=pd.DatetimeIndex(days[starts]))
+    return DashboardData(df, mentions_over_time)
+
+def display_bar_chart(counts, x_label):
+    """Draws a bar chart of mention counts, keeping the order of the counts (highest first) instead of sorting by label."""
+    chart_data = counts.rename_axis(x_label).reset_index(name='Number of Mentions')
+    chart = alt.Chart(chart_data).mark_bar(color='#5D8AA8').encode(
+        x=alt.X(field=x_label, type='nominal', sort=None, title=x_label),
+        y=alt.Y(field='Number of Mentions', type='quantitative', title='Number of Mentions'),
+    )
+    st.altair_chart(chart)
+
+@st.fragment  # Moving the slider reruns only this section, not the whole dashboard
+def display_latest_mentions(df_filtered_all):
+    """
+    Displays the slider-driven analysis of the latest mentions: top source and the latest-N charts.
+    Expects the latest-first DataFrame returned by prepare_data.
+    """
+    # --- Widget for Latest Mentions ---
     # Determine max value for the slider
     max_mentions = len(df_filtered_all)
     
-    st.sidebar.header("📊 Analysis Settings")
     # Add a slider to select the number of latest mentions to analyze
-    latest_n = st.sidebar.slider(
-        "Select Number of Latest Mentions for Analysis:",
+    latest_n = st.slider(
+        "📊 Select Number of Latest Mentions for Analysis:",
         min_value=1,
         max_value=max_mentions,
         value=min(30, max_mentions), # Default to 30 or the total count if less than 30
         step=1
     )
     
-    # 2. Filter the DataFrame to the selected number of latest mentions
-    df_latest = df_filtered_all.head(latest_n).copy()
+    # Slice the DataFrame to the selected number of latest mentions
+    df_latest = df_filtered_all.iloc[:latest_n]
+
+    # Use the LATEST data for TOP SOURCE calculation
+    # Count without sorting; only the top 10 are ever shown, so a partial selection is enough
+    # Count the integer category codes rather than the categorical itself, so the counts stay in order of
+    # first appearance (most recent first) and ties go to the most recent source, not the alphabetical one
+    source_codes = df_latest['source'].cat.codes
+    mentions_by_source_latest = source_codes[source_codes >= 0].value_counts(sort=False)
+    mentions_by_source_latest.index = df_latest['source'].cat.categories[mentions_by_source_latest.index]
+    top_sources_latest = mentions_by_source_latest.nlargest(10)
+    top_source_latest = mentions_by_source_latest.idxmax() if not mentions_by_source_latest.empty else "N/A"
+
+    st.success(f"### Top Source (Latest {latest_n})\n\n**{top_source_latest}** is the top-mentioning source in the latest set.")
     
-    # Re-sort the final display table data to be sequential (oldest to latest)
-    # The main table (df_display) should still be sequential
-    df_display = df_filtered_all.sort_values(by='daily_update', ascending=True).copy()
+    # Only calculate and display charts for the LATEST data
+    st.markdown(f"**Visualizations based on the latest {latest_n} mentions only.**")
 
-    # -------------------------------------------
+    # Charts are handed to Streamlit as data and rendered client-side (Vega-Lite)
 
-    # --- High-Level Overview Section ---
-    st.markdown("---")
-    st.markdown("""
-        <div style="text-align: center; border-bottom: 2px solid #5D8AA8; padding-bottom: 10px;">
-            <h1 style="color: #5D8AA8;">Dashboard Overview</h1>
-        </div>
-    """, unsafe_allow_html=True)
+    # Chart 1: Mentions by Source Category (using LATEST data)
+    mentions_by_category_latest = df_latest['source_category'].value_counts()
+    st.subheader(f"Mentions by Source Category (Latest {latest_n})")
+    display_bar_chart(mentions_by_category_latest, 'Category')
 
-    # Update the 'Total Mentions' count (based on the filtered data)
-    total_mentions = len(df_filtered_all)
-    
-    # Use the LATEST data for TOP SOURCE calculation
-    mentions_by_source_latest = df_latest['source'].value_counts()
-    top_source_latest = mentions_by_source_latest.index[0] if not mentions_by_source_latest.empty else "N/A"
+    # Chart 2: Mentions by Source (using LATEST data)
+    st.subheader(f"Top Sources by Mention (Latest {latest_n})")
+    display_bar_chart(top_sources_latest, 'Source')
 
-    col1, col2 = st.columns(2)
-    with col1:
-        st.info(f"### Total Mentions\n\n**{total_mentions}** mentions recorded!")
-    with col2:
-        st.success(f"### Top Source (Latest {latest_n})\n\n**{top_source_latest}** is the top-mentioning source in the latest set.")
+@st.fragment  # Paging through the table reruns only the table
+def display_mentions_table(df_display):
+    """
+    Displays the mentions table one page of TABLE_PAGE_SIZE rows at a time,
+    so only the selected page is sent to the browser.
+    """
+    total_rows = len(df_display)
+    page_count = max(1, -(-total_rows // TABLE_PAGE_SIZE))  # Ceiling division
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    start = (page - 1) * TABLE_PAGE_SIZE
+    df_page = df_display.iloc[start:start + TABLE_PAGE_SIZE]
+    st.caption(f"Showing mentions {min(start + 1, total_rows)}–{start + len(df_page)} of {total_rows}")
 
-    # --- All Mentions Details Section ---
-    st.markdown("---")
-    st.markdown("""
-        <div style="text-align: center; border-bottom: 2px solid #5D8AA8; padding-bottom: 10px; margin-top: 30px;">
-            <h2 style="color: #5D8AA8;">All Mentions Details (Oldest to Latest)</h2>
-        </div>
-    """, unsafe_allow_html=True)
-    
     # Display all mentions in an interactive table with clickable links
     st.data_editor(
-        df_display[['daily_update', 'source', 'title', 'snippet', 'url']].rename(columns={
+        df_page[['daily_update', 'source', 'title', 'snippet', 'url']].rename(columns={
             'daily_update': 'Date',
             'source': 'Source',
             'title': 'Title',
@@ -150,60 +265,66 @@ def display_dashboard(df_combined):
         }
     )
 
-    # --- Visualizations Section ---
-    st.markdown("---")
+def display_dashboard(data):
+    """
+    Displays the dashboard with a more visually appealing design, now focusing on the latest mentions.
+    Expects the DashboardData returned by prepare_data.
+    """
+    # --- APPLYING REQUESTED FILTERS AND SORTS ---
+    # prepare_data has already filtered out 'pesa check' and sorted latest first,
+    # so everything below is a slice of the same frame rather than a copy
+    df_filtered_all = data.mentions
     
-    # Only calculate and display charts for the LATEST data
-    st.markdown(f"**Visualizations based on the latest {latest_n} mentions only.**")
+    # The main table (df_display) should still be sequential (oldest to latest)
+    df_display = df_filtered_all.iloc[::-1]
 
-    plt.style.use('dark_background')
+    # -------------------------------------------
 
-    # Chart 1: Mentions by Source Category (using LATEST data)
-    mentions_by_category_latest = df_latest['source_category'].value_counts()
-    st.subheader(f"Mentions by Source Category (Latest {latest_n})")
-    fig, ax = plt.subplots(figsize=(10, 6))
-    mentions_by_category_latest.plot(kind='bar', color=plt.cm.viridis.colors, ax=ax)
-    ax.set_title(f'Mentions by Source Category (Latest {latest_n})', fontsize=16, color='white')
-    ax.set_xlabel('Category', fontsize=12, color='white')
-    ax.set_ylabel('Number of Mentions', fontsize=12, color='white')
-    ax.tick_params(colors='white')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig)
+    # --- High-Level Overview Section ---
+    st.markdown("---")
+    st.markdown("""
+        <div style="text-align: center; border-bottom: 2px solid #5D8AA8; padding-bottom: 10px;">
+            <h1 style="color: #5D8AA8;">Dashboard Overview</h1>
+        </div>
+    """, unsafe_allow_html=True)
 
-    # Chart 2: Mentions by Source (using LATEST data)
-    st.subheader(f"Top Sources by Mention (Latest {latest_n})")
-    fig, ax = plt.subplots(figsize=(10, 6))
-    mentions_by_source_latest.plot(kind='bar', color=plt.cm.Paired.colors, ax=ax)
-    ax.set_title(f'Mentions by Source (Latest {latest_n})', fontsize=16, color='white')
-    ax.set_xlabel('Source', fontsize=12, color='white')
-    ax.set_ylabel('Number of Mentions', fontsize=12, color='white')
-    ax.tick_params(colors='white')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig)
+    # Update the 'Total Mentions' count (based on the filtered data)
+    total_mentions = len(df_filtered_all)
+    st.info(f"### Total Mentions\n\n**{total_mentions}** mentions recorded!")
+
+    # --- All Mentions Details Section ---
+    st.markdown("---")
+    st.markdown("""
+        <div style="text-align: center; border-bottom: 2px solid #5D8AA8; padding-bottom: 10px; margin-top: 30px;">
+            <h2 style="color: #5D8AA8;">All Mentions Details (Oldest to Latest)</h2>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    # Display all mentions, one page at a time
+    display_mentions_table(df_display)
+
+    # --- Visualizations Section ---
+    st.markdown("---")
+
+    # Latest-N analysis (slider, top source and charts) reruns on its own
+    display_latest_mentions(df_filtered_all)
     
     # Chart 3: Mentions Over Time (using ALL filtered data to show the full trend)
     st.subheader("Mentions Over Time (Full Trend)")
-    mentions_over_time_all = df_filtered_all.groupby('daily_update').size()
-    fig, ax = plt.subplots(figsize=(10, 6))
-    mentions_over_time_all.plot(kind='line', marker='o', linestyle='-', color='#5D8AA8', ax=ax)
-    ax.set_title('Mentions Over Time (All Data)', fontsize=16, color='white')
-    ax.set_xlabel('Date', fontsize=12, color='white')
-    ax.set_ylabel('Number of Mentions', fontsize=12, color='white')
-    ax.grid(True, linestyle='--', alpha=0.6, color='gray')
-    ax.tick_params(colors='white')
-    plt.tight_layout()
-    st.pyplot(fig)
+    st.line_chart(data.mentions_over_time, x_label='Date', y_label='Number of Mentions', color='#5D8AA8')
 
 def main():
     st.set_page_config(layout="wide", page_title="Code for Africa's Work Mentions Tracking Dashboard")
     st.title("Code for Africa's Work Mentions Tracking Dashboard")
     
     st.sidebar.info("Loading data directly from your Google Sheet.")
-    df = load_data_from_google_sheet()
-    if df is not None:
-        display_dashboard(df)
+    try:
+        data = load_data_from_google_sheet()
+    except SheetColumnsError as e:
+        st.error(str(e))
+        data = None
+    if data is not None:
+        display_dashboard(data)
     else:
         st.warning("Data could not be loaded from Google Sheet. Please check the credentials and sheet info.")
 